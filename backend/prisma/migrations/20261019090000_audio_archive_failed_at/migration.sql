@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "Audio" ADD COLUMN "archiveFailedAt" DATETIME;
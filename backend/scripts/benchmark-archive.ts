@@ -0,0 +1,92 @@
+/**
+ * Archive transcode benchmark
+ * Usage: npm run bench:archive -- <file-or-directory> [...]
+ *
+ * Transcodes the given recordings with the same settings as ArchiveService
+ * (into a temp dir, originals untouched) and reports CPU-seconds per
+ * audio-hour plus the size reduction.
+ */
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+import {
+  probeDuration,
+  runPool,
+  transcodeToOpus,
+} from '../src/archive/opus-transcoder';
+
+function collectFiles(inputs: string[]): string[] {
+  return inputs.flatMap((input) =>
+    fs.statSync(input).isDirectory()
+      ? fs
+          .readdirSync(input)
+          .map((name) => path.join(input, name))
+          .filter((p) => fs.statSync(p).isFile())
+      : [input],
+  );
+}
+
+async function main() {
+  const files = collectFiles(process.argv.slice(2));
+  if (files.length === 0) {
+    console.error('Usage: npm run bench:archive -- <file-or-directory> [...]');
+    process.exit(1);
+  }
+
+  const concurrency =
+    Number(process.env.ARCHIVE_CONCURRENCY) ||
+    Math.max(1, os.cpus().length - 1);
+  const outDir = fs.mkdtempSync(path.join(os.tmpdir(), 'archive-bench-'));
+  const started = Date.now();
+
+  try {
+    const rows = await runPool(files, concurrency, async (file) => {
+      const target = path.join(outDir, `${path.basename(file)}.opus`);
+      const { cpuSeconds } = await transcodeToOpus(file, target);
+      return {
+        file: path.basename(file),
+        audioSeconds: await probeDuration(file),
+        cpuSeconds,
+        bytesBefore: fs.statSync(file).size,
+        bytesAfter: fs.statSync(target).size,
+      };
+    });
+
+    const sum = (key: keyof (typeof rows)[number]) =>
+      rows.reduce((s, r) => s + (r[key] as number), 0);
+    const audioHours = sum('audioSeconds') / 3600;
+    // ffmpeg builds without -benchmark output leave the CPU figures blank
+    const cpuMeasured = rows.every((r) => r.cpuSeconds !== null);
+    const cpuFigure = (value: number, digits: number) =>
+      cpuMeasured ? value.toFixed(digits) : 'unavailable';
+
+    console.table(
+      rows.map((r) => ({
+        file: r.file,
+        'audio (s)': r.audioSeconds.toFixed(1),
+        'CPU (s)': r.cpuSeconds?.toFixed(2) ?? 'unavailable',
+        ratio: (r.bytesBefore / r.bytesAfter).toFixed(1) + 'x',
+      })),
+    );
+    console.log(`Files:                 ${rows.length}`);
+    console.log(`Workers:               ${concurrency}`);
+    console.log(`Audio:                 ${audioHours.toFixed(3)} h`);
+    console.log(`CPU:                   ${cpuFigure(sum('cpuSeconds'), 2)} s`);
+    console.log(
+      `Wall:                  ${((Date.now() - started) / 1000).toFixed(2)} s`,
+    );
+    console.log(
+      `CPU-s per audio-hour:  ${cpuFigure(sum('cpuSeconds') / audioHours, 1)}`,
+    );
+    console.log(
+      `Size:                  ${sum('bytesBefore')} -> ${sum('bytesAfter')} bytes (${(sum('bytesBefore') / sum('bytesAfter')).toFixed(1)}x)`,
+    );
+  } finally {
+    fs.rmSync(outDir, { recursive: true, force: true });
+  }
+}
+
+main().catch((e) => {
+  console.error(e);
+  process.exit(1);
+});
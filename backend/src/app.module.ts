@@ -6,6 +6,8 @@ import { AudioModule } from './audio/audio.module';
 import { TranscriptionModule } from './transcription/transcription.module';
 import { AnalysisModule } from './analysis/analysis.module';
 import { ExportModule } from './export/export.module';
+import { ArchiveModule } from './archive/archive.module';
+import { ReconcileModule } from './reconcile/reconcile.module';
 
 @Module({
   imports: [
@@ -14,6 +16,8 @@ import { ExportModule } from './export/export.module';
     TranscriptionModule,
     AnalysisModule,
     ExportModule,
+    ArchiveModule,
+    ReconcileModule,
   ],
   controllers: [AppController],
   providers: [AppService],
@@ -0,0 +1,24 @@
+import {
+  BadRequestException,
+  Controller,
+  ParseFloatPipe,
+  Post,
+  Query,
+} from '@nestjs/common';
+import { ArchiveService } from './archive.service';
+
+@Controller('archive')
+export class ArchiveController {
+  constructor(private readonly archiveService: ArchiveService) {}
+
+  @Post('run')
+  async run(
+    @Query('minAgeDays', new ParseFloatPipe({ optional: true }))
+    minAgeDays?: number,
+  ) {
+    if (minAgeDays !== undefined && minAgeDays < 0) {
+      throw new BadRequestException('minAgeDays must not be negative');
+    }
+    return this.archiveService.archiveEligible(minAgeDays);
+  }
+}
@@ -0,0 +1,10 @@
+import { Module } from '@nestjs/common';
+import { ArchiveController } from './archive.controller';
+import { ArchiveService } from './archive.service';
+
+@Module({
+  controllers: [ArchiveController],
+  providers: [ArchiveService],
+  exports: [ArchiveService],
+})
+export class ArchiveModule {}
@@ -0,0 +1,234 @@
+import { Test, TestingModule } from '@nestjs/testing';
+import { ArchiveService, archivePathFor } from './archive.service';
+import { PrismaService } from '../prisma/prisma.service';
+import {
+  DEFAULT_OPUS_OPTIONS,
+  parseBenchmark,
+  probeDuration,
+  runPool,
+  transcodeToOpus,
+} from './opus-transcoder';
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+
+jest.mock('./opus-transcoder', () => ({
+  ...jest.requireActual('./opus-transcoder'),
+  transcodeToOpus: jest.fn(),
+  probeDuration: jest.fn(),
+}));
+
+const mockTranscode = transcodeToOpus as jest.MockedFunction<
+  typeof transcodeToOpus
+>;
+const mockProbe = probeDuration as jest.MockedFunction<typeof probeDuration>;
+
+describe('ArchiveService', () => {
+  let service: ArchiveService;
+  let workDir: string;
+  let source: string;
+  let target: string;
+  const prisma = { audio: { findMany: jest.fn(), update: jest.fn() } };
+
+  beforeEach(async () => {
+    jest.resetAllMocks();
+    workDir = fs.mkdtempSync(path.join(os.tmpdir(), 'archive-spec-'));
+    source = path.join(workDir, '123-meeting.wav');
+    target = path.join(workDir, '123-meeting.opus');
+    fs.writeFileSync(source, Buffer.alloc(1000));
+
+    // Pretend ffmpeg wrote a 100-byte archive
+    mockTranscode.mockImplementation(async (_input, output) => {
+      fs.writeFileSync(output, Buffer.alloc(100));
+      return { cpuSeconds: 1.5, wallSeconds: 2 };
+    });
+    mockProbe.mockResolvedValue(60);
+
+    const module: TestingModule = await Test.createTestingModule({
+      providers: [ArchiveService, { provide: PrismaService, useValue: prisma }],
+    }).compile();
+
+    service = module.get<ArchiveService>(ArchiveService);
+  });
+
+  afterEach(() => {
+    fs.rmSync(workDir, { recursive: true, force: true });
+  });
+
+  const archive = () =>
+    service.archiveAudio({ id: 'a1', originalS3Key: source, duration: null });
+
+  // Failed attempts are stamped so the next runs skip them for a while
+  const expectMarkedFailed = () => {
+    expect(prisma.audio.update).toHaveBeenCalledTimes(1);
+    expect(prisma.audio.update).toHaveBeenCalledWith({
+      where: { id: 'a1' },
+      data: { archiveFailedAt: expect.any(Date) },
+    });
+  };
+
+  it('should be defined', () => {
+    expect(service).toBeDefined();
+  });
+
+  it('reports missing originals without touching the record', async () => {
+    fs.unlinkSync(source);
+    const result = await archive();
+    expect(result).toEqual({ audioId: 'a1', status: 'missing' });
+    expect(mockTranscode).not.toHaveBeenCalled();
+    expectMarkedFailed();
+  });
+
+  it('publishes the archive, updates the record, then drops the original', async () => {
+    prisma.audio.update.mockImplementation(async () => {
+      // The record is only repointed once the archive is in place, and the
+      // original is still there in case the update fails.
+      expect(fs.existsSync(target)).toBe(true);
+      expect(fs.existsSync(source)).toBe(true);
+    });
+
+    const result = await archive();
+
+    expect(result).toMatchObject({
+      status: 'archived',
+      archivePath: target,
+      bytesBefore: 1000,
+      bytesAfter: 100,
+      audioSeconds: 60,
+      cpuSeconds: 1.5,
+    });
+    expect(prisma.audio.update).toHaveBeenCalledWith({
+      where: { id: 'a1' },
+      data: {
+        processedS3Key: target,
+        mimeType: 'audio/ogg',
+        fileSize: 100,
+        duration: 60,
+        sampleRate: DEFAULT_OPUS_OPTIONS.sampleRate,
+        channels: 1,
+        archiveFailedAt: null,
+      },
+    });
+    expect(fs.existsSync(source)).toBe(false);
+    expect(fs.existsSync(`${target}.part`)).toBe(false);
+  });
+
+  it('keeps the original when the durations do not match', async () => {
+    mockProbe.mockImplementation(async (file) => (file === source ? 60 : 55));
+
+    const result = await archive();
+
+    expect(result.status).toBe('failed');
+    expect(result.error).toMatch(/Duration mismatch/);
+    expectMarkedFailed();
+    expect(fs.existsSync(source)).toBe(true);
+    expect(fs.existsSync(target)).toBe(false);
+    expect(fs.existsSync(`${target}.part`)).toBe(false);
+  });
+
+  it('rolls back the archive when the record update fails', async () => {
+    prisma.audio.update.mockRejectedValue(new Error('database is locked'));
+
+    const result = await archive();
+
+    expect(result).toEqual({
+      audioId: 'a1',
+      status: 'failed',
+      error: 'database is locked',
+    });
+    expect(fs.existsSync(source)).toBe(true);
+    expect(fs.existsSync(target)).toBe(false);
+    expect(fs.existsSync(`${target}.part`)).toBe(false);
+  });
+
+  it('removes the partial archive when transcoding fails', async () => {
+    mockTranscode.mockImplementation(async (_input, output) => {
+      fs.writeFileSync(output, Buffer.alloc(10));
+      throw new Error('ffmpeg exited with code 1');
+    });
+
+    const result = await archive();
+
+    expect(result.status).toBe('failed');
+    expect(mockProbe).not.toHaveBeenCalled();
+    expectMarkedFailed();
+    expect(fs.existsSync(source)).toBe(true);
+    expect(fs.existsSync(`${target}.part`)).toBe(false);
+  });
+
+  it('skips recordings that failed recently', async () => {
+    prisma.audio.findMany.mockResolvedValue([]);
+
+    await service.archiveEligible(7);
+
+    const { where, orderBy } = prisma.audio.findMany.mock.calls[0][0];
+    expect(where.OR).toEqual([
+      { archiveFailedAt: null },
+      { archiveFailedAt: { lte: expect.any(Date) } },
+    ]);
+    expect(orderBy).toEqual([{ processedAt: 'asc' }, { id: 'asc' }]);
+  });
+
+  it('reports CPU cost as unavailable when ffmpeg gives no timings', async () => {
+    prisma.audio.findMany.mockResolvedValue([
+      { id: 'a1', originalS3Key: source, duration: null },
+    ]);
+    mockTranscode.mockImplementation(async (_input, output) => {
+      fs.writeFileSync(output, Buffer.alloc(100));
+      return { cpuSeconds: null, wallSeconds: null };
+    });
+
+    const summary = await service.archiveEligible(0);
+
+    expect(summary).toMatchObject({
+      archived: 1,
+      cpuSecondsPerAudioHour: null,
+    });
+  });
+});
+
+describe('archivePathFor', () => {
+  it('replaces the extension with .opus', () => {
+    expect(archivePathFor('uploads/123-meeting.wav')).toBe(
+      'uploads/123-meeting.opus',
+    );
+  });
+
+  it('never returns the source path', () => {
+    expect(archivePathFor('uploads/123-note.opus')).toBe(
+      'uploads/123-note.archive.opus',
+    );
+  });
+});
+
+describe('opus-transcoder', () => {
+  it('parses ffmpeg -benchmark output', () => {
+    const stderr =
+      'size=     120kB time=00:01:00.00\nbench: utime=1.250s stime=0.250s rtime=2.000s\n';
+    expect(parseBenchmark(stderr)).toEqual({
+      cpuSeconds: 1.5,
+      wallSeconds: 2,
+    });
+  });
+
+  it('leaves timings empty when there is no bench line', () => {
+    expect(parseBenchmark('size=     120kB time=00:01:00.00\n')).toEqual({
+      cpuSeconds: null,
+      wallSeconds: null,
+    });
+  });
+
+  it('limits concurrency and keeps result order', async () => {
+    let inFlight = 0;
+    let peak = 0;
+    const results = await runPool([1, 2, 3, 4, 5], 2, async (n) => {
+      inFlight++;
+      peak = Math.max(peak, inFlight);
+      await new Promise((r) => setTimeout(r, 5));
+      inFlight--;
+      return n * 10;
+    });
+    expect(results).toEqual([10, 20, 30, 40, 50]);
+    expect(peak).toBe(2);
+  });
+});
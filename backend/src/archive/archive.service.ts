@@ -0,0 +1,252 @@
+import {
+  Injectable,
+  Logger,
+  OnModuleDestroy,
+  OnModuleInit,
+} from '@nestjs/common';
+import { PrismaService } from '../prisma/prisma.service';
+import {
+  DEFAULT_OPUS_OPTIONS,
+  probeDuration,
+  runPool,
+  transcodeToOpus,
+} from './opus-transcoder';
+import * as fs from 'fs';
+import * as os from 'os';
+
+interface ArchiveCandidate {
+  id: string;
+  originalS3Key: string;
+  duration: number | null;
+}
+
+export interface ArchiveResult {
+  audioId: string;
+  status: 'archived' | 'missing' | 'failed';
+  archivePath?: string;
+  bytesBefore?: number;
+  bytesAfter?: number;
+  audioSeconds?: number;
+  cpuSeconds?: number | null;
+  error?: string;
+}
+
+export interface ArchiveRunSummary {
+  cutoff: Date;
+  candidates: number;
+  archived: number;
+  failed: number;
+  bytesBefore: number;
+  bytesAfter: number;
+  cpuSecondsPerAudioHour: number | null;
+  results: ArchiveResult[];
+}
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+
+// Returns where the archived copy of `source` should live, never the same
+// path as the source itself (uploads may already be .opus).
+export function archivePathFor(source: string): string {
+  const base = source.replace(/\.[^/.]+$/, '');
+  const target = `${base}.opus`;
+  return target === source ? `${base}.archive.opus` : target;
+}
+
+@Injectable()
+export class ArchiveService implements OnModuleInit, OnModuleDestroy {
+  private readonly logger = new Logger(ArchiveService.name);
+  private timer?: NodeJS.Timeout;
+  private running = false;
+
+  // Age policy: only recordings transcribed at least this many days ago are
+  // archived, so recent uploads keep their original for re-processing.
+  private readonly minAgeDays = Number(process.env.ARCHIVE_MIN_AGE_DAYS ?? 7);
+  private readonly intervalMinutes = Number(
+    process.env.ARCHIVE_INTERVAL_MINUTES ?? 0,
+  );
+  private readonly batchSize = Number(process.env.ARCHIVE_BATCH_SIZE) || 50;
+  private readonly concurrency =
+    Number(process.env.ARCHIVE_CONCURRENCY) ||
+    Math.max(1, os.cpus().length - 1);
+  private readonly durationTolerance = Number(
+    process.env.ARCHIVE_DURATION_TOLERANCE_S ?? 0.5,
+  );
+  // Failed recordings are set aside this long so they do not hold up the
+  // rest of the queue on every run.
+  private readonly retryDays = Number(process.env.ARCHIVE_RETRY_DAYS ?? 7);
+
+  constructor(private prisma: PrismaService) {}
+
+  onModuleInit() {
+    if (this.intervalMinutes > 0) {
+      this.timer = setInterval(() => {
+        this.archiveEligible().catch((e) =>
+          this.logger.error(`Scheduled archive run failed: ${e.message}`),
+        );
+      }, this.intervalMinutes * 60 * 1000);
+      this.timer.unref();
+    }
+  }
+
+  onModuleDestroy() {
+    if (this.timer) {
+      clearInterval(this.timer);
+    }
+  }
+
+  async archiveEligible(
+    minAgeDays: number = this.minAgeDays,
+  ): Promise<ArchiveRunSummary | { status: 'busy' }> {
+    if (this.running) {
+      return { status: 'busy' };
+    }
+    this.running = true;
+
+    try {
+      const cutoff = new Date(Date.now() - minAgeDays * DAY_MS);
+      const retryCutoff = new Date(Date.now() - this.retryDays * DAY_MS);
+      const candidates = await this.prisma.audio.findMany({
+        where: {
+          processingStatus: 'COMPLETED',
+          processedS3Key: null,
+          processedAt: { lte: cutoff },
+          OR: [
+            { archiveFailedAt: null },
+            { archiveFailedAt: { lte: retryCutoff } },
+          ],
+        },
+        orderBy: [{ processedAt: 'asc' }, { id: 'asc' }],
+        take: this.batchSize,
+        select: { id: true, originalS3Key: true, duration: true },
+      });
+
+      this.logger.log(
+        `Archiving ${candidates.length} recordings (cutoff ${cutoff.toISOString()}, ${this.concurrency} workers)`,
+      );
+
+      const results = await runPool(candidates, this.concurrency, (audio) =>
+        this.archiveAudio(audio),
+      );
+
+      const archived = results.filter((r) => r.status === 'archived');
+      // Unavailable if ffmpeg did not report timings for any of them
+      const cpuMeasured = archived.every((r) => r.cpuSeconds != null);
+      const cpuSeconds = archived.reduce((s, r) => s + (r.cpuSeconds ?? 0), 0);
+      const audioSeconds = archived.reduce(
+        (s, r) => s + (r.audioSeconds ?? 0),
+        0,
+      );
+
+      const summary: ArchiveRunSummary = {
+        cutoff,
+        candidates: candidates.length,
+        archived: archived.length,
+        failed: results.length - archived.length,
+        bytesBefore: archived.reduce((s, r) => s + (r.bytesBefore ?? 0), 0),
+        bytesAfter: archived.reduce((s, r) => s + (r.bytesAfter ?? 0), 0),
+        cpuSecondsPerAudioHour:
+          cpuMeasured && audioSeconds > 0
+            ? cpuSeconds / (audioSeconds / 3600)
+            : null,
+        results,
+      };
+
+      this.logger.log(
+        `Archive run done: ${summary.archived} archived, ${summary.failed} failed, ${summary.bytesBefore} -> ${summary.bytesAfter} bytes`,
+      );
+      return summary;
+    } finally {
+      this.running = false;
+    }
+  }
+
+  async archiveAudio(audio: ArchiveCandidate): Promise<ArchiveResult> {
+    const source = audio.originalS3Key;
+    const target = archivePathFor(source);
+    const partial = `${target}.part`;
+
+    if (!fs.existsSync(source)) {
+      this.logger.warn(`Original missing for ${audio.id}: ${source}`);
+      await this.markFailed(audio.id);
+      return { audioId: audio.id, status: 'missing' };
+    }
+
+    try {
+      // 1. Transcode next to the original without touching it
+      const { cpuSeconds } = await transcodeToOpus(source, partial);
+
+      // 2. Verify duration parity before trusting the archive
+      const [sourceDuration, archiveDuration] = await Promise.all([
+        probeDuration(source),
+        probeDuration(partial),
+      ]);
+      if (Math.abs(sourceDuration - archiveDuration) > this.durationTolerance) {
+        throw new Error(
+          `Duration mismatch: original ${sourceDuration}s, archive ${archiveDuration}s`,
+        );
+      }
+
+      const bytesBefore = fs.statSync(source).size;
+      const bytesAfter = fs.statSync(partial).size;
+
+      // 3. Swap: publish the archive, point the record at it, drop the original
+      await fs.promises.rename(partial, target);
+      try {
+        await this.prisma.audio.update({
+          where: { id: audio.id },
+          data: {
+            processedS3Key: target,
+            mimeType: 'audio/ogg',
+            fileSize: bytesAfter,
+            duration: audio.duration ?? sourceDuration,
+            sampleRate: DEFAULT_OPUS_OPTIONS.sampleRate,
+            channels: 1,
+            archiveFailedAt: null,
+          },
+        });
+      } catch (dbError) {
+        await fs.promises.unlink(target).catch(() => {});
+        throw dbError;
+      }
+
+      try {
+        await fs.promises.unlink(source);
+      } catch (e) {
+        this.logger.warn(
+          `Archived ${audio.id} but could not delete ${source}: ${e}`,
+        );
+      }
+
+      this.logger.log(
+        `Archived ${audio.id}: ${bytesBefore} -> ${bytesAfter} bytes (${cpuSeconds?.toFixed(2) ?? 'n/a'} CPU-s)`,
+      );
+
+      return {
+        audioId: audio.id,
+        status: 'archived',
+        archivePath: target,
+        bytesBefore,
+        bytesAfter,
+        audioSeconds: sourceDuration,
+        cpuSeconds,
+      };
+    } catch (error: any) {
+      await fs.promises.unlink(partial).catch(() => {});
+      this.logger.error(`Failed to archive ${audio.id}: ${error.message}`);
+      await this.markFailed(audio.id);
+      return { audioId: audio.id, status: 'failed', error: error.message };
+    }
+  }
+
+  // Best effort: if this fails too, the recording is simply retried next run.
+  private async markFailed(audioId: string) {
+    try {
+      await this.prisma.audio.update({
+        where: { id: audioId },
+        data: { archiveFailedAt: new Date() },
+      });
+    } catch (e: any) {
+      this.logger.warn(`Could not mark ${audioId} as failed: ${e.message}`);
+    }
+  }
+}
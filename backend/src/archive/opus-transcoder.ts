@@ -0,0 +1,134 @@
+import { spawn } from 'child_process';
+
+export interface OpusTranscodeOptions {
+  bitrate: string; // e.g. "24k"
+  sampleRate: number; // Opus accepts 8000, 12000, 16000, 24000 or 48000
+}
+
+export interface OpusTranscodeResult {
+  // user + system and wall time reported by ffmpeg -benchmark, or null if
+  // ffmpeg did not print them
+  cpuSeconds: number | null;
+  wallSeconds: number | null;
+}
+
+// Mono 16 kHz VOIP-tuned Opus is plenty for speech and is what Deepgram
+// would resample to anyway, so nothing is lost for re-transcription.
+export const DEFAULT_OPUS_OPTIONS: OpusTranscodeOptions = {
+  bitrate: process.env.ARCHIVE_OPUS_BITRATE || '24k',
+  sampleRate: Number(process.env.ARCHIVE_OPUS_SAMPLE_RATE) || 16000,
+};
+
+function run(
+  command: string,
+  args: string[],
+): Promise<{ stdout: string; stderr: string }> {
+  return new Promise((resolve, reject) => {
+    const child = spawn(command, args, { stdio: ['ignore', 'pipe', 'pipe'] });
+    let stdout = '';
+    let stderr = '';
+    child.stdout.on('data', (chunk) => (stdout += chunk));
+    child.stderr.on('data', (chunk) => (stderr += chunk));
+    child.on('error', reject);
+    child.on('close', (code) => {
+      if (code === 0) {
+        resolve({ stdout, stderr });
+      } else {
+        reject(
+          new Error(
+            `${command} exited with code ${code}: ${stderr.trim().split('\n').pop()}`,
+          ),
+        );
+      }
+    });
+  });
+}
+
+// Parses the "bench: utime=1.234s stime=0.056s rtime=2.000s" line printed by
+// ffmpeg when run with -benchmark.
+export function parseBenchmark(stderr: string): OpusTranscodeResult {
+  const match = stderr.match(
+    /bench:\s+utime=([\d.]+)s\s+stime=([\d.]+)s\s+rtime=([\d.]+)s/,
+  );
+  if (!match) {
+    return { cpuSeconds: null, wallSeconds: null };
+  }
+  return {
+    cpuSeconds: parseFloat(match[1]) + parseFloat(match[2]),
+    wallSeconds: parseFloat(match[3]),
+  };
+}
+
+export async function probeDuration(filePath: string): Promise<number> {
+  const { stdout } = await run('ffprobe', [
+    '-v',
+    'error',
+    '-show_entries',
+    'format=duration',
+    '-of',
+    'default=noprint_wrappers=1:nokey=1',
+    filePath,
+  ]);
+  const duration = parseFloat(stdout.trim());
+  if (!Number.isFinite(duration)) {
+    throw new Error(`Could not read duration of ${filePath}`);
+  }
+  return duration;
+}
+
+// Each call is its own ffmpeg process pinned to one thread, so running N of
+// them concurrently gives a pool of N single-core workers.
+export async function transcodeToOpus(
+  inputPath: string,
+  outputPath: string,
+  options: OpusTranscodeOptions = DEFAULT_OPUS_OPTIONS,
+): Promise<OpusTranscodeResult> {
+  const { stderr } = await run('ffmpeg', [
+    '-hide_banner',
+    '-nostdin',
+    '-benchmark',
+    '-y',
+    '-i',
+    inputPath,
+    '-vn',
+    '-map_metadata',
+    '-1',
+    '-ac',
+    '1',
+    '-ar',
+    String(options.sampleRate),
+    '-c:a',
+    'libopus',
+    '-b:a',
+    options.bitrate,
+    '-application',
+    'voip',
+    '-threads',
+    '1',
+    '-f',
+    'opus',
+    outputPath,
+  ]);
+  return parseBenchmark(stderr);
+}
+
+// Runs `worker` over `items` with at most `concurrency` in flight.
+export async function runPool<T, R>(
+  items: T[],
+  concurrency: number,
+  worker: (item: T) => Promise<R>,
+): Promise<R[]> {
+  const results: R[] = new Array(items.length);
+  let next = 0;
+  const lanes = Array.from(
+    { length: Math.max(1, Math.min(concurrency, items.length)) },
+    async () => {
+      while (next < items.length) {
+        const index = next++;
+        results[index] = await worker(items[index]);
+      }
+    },
+  );
+  await Promise.all(lanes);
+  return results;
+}
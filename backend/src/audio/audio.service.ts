@@ -1,5 +1,6 @@
 import { Injectable } from '@nestjs/common';
 import { PrismaService } from '../prisma/prisma.service';
+import { storedFilePath } from './stored-file';
 import * as fs from 'fs';
 
 @Injectable()
@@ -128,39 +129,45 @@ export class AudioService {
         // if the intent was clean up.
       }
 
-      // 2. Delete Physical File (Best Effort)
-      if (audio.originalS3Key) {
-        const filePath = audio.originalS3Key;
-        if (fs.existsSync(filePath)) {
-          try {
-            // Retry logic for Windows file locking
-            let retries = 3;
-            while (retries > 0) {
-              try {
-                fs.unlinkSync(filePath);
-                console.log(`[AudioService] Deleted file: ${filePath}`);
-                break;
-              } catch (e: any) {
-                if (e.code === 'EBUSY' || e.code === 'EPERM') {
-                  console.warn(
-                    `[AudioService] File locked, retrying in 500ms... (${retries})`,
-                  );
-                  await new Promise((r) => setTimeout(r, 500));
-                  retries--;
-                } else {
-                  throw e;
-                }
-              }
-            }
-          } catch (e) {
-            console.error(
-              `[AudioService] FAILED to delete file after retries: ${filePath}`,
-              e,
+      // 2. Delete Physical Files (Best Effort)
+      // The original may still linger if the archive swap could not remove it.
+      const filePaths = new Set([audio.originalS3Key, storedFilePath(audio)]);
+      for (const filePath of filePaths) {
+        await this.deleteFileWithRetry(filePath);
+      }
+    }
+    return { status: 'deleted', id };
+  }
+
+  private async deleteFileWithRetry(filePath: string) {
+    if (!fs.existsSync(filePath)) {
+      return;
+    }
+    try {
+      // Retry logic for Windows file locking
+      let retries = 3;
+      while (retries > 0) {
+        try {
+          fs.unlinkSync(filePath);
+          console.log(`[AudioService] Deleted file: ${filePath}`);
+          break;
+        } catch (e: any) {
+          if (e.code === 'EBUSY' || e.code === 'EPERM') {
+            console.warn(
+              `[AudioService] File locked, retrying in 500ms... (${retries})`,
             );
+            await new Promise((r) => setTimeout(r, 500));
+            retries--;
+          } else {
+            throw e;
           }
         }
       }
+    } catch (e) {
+      console.error(
+        `[AudioService] FAILED to delete file after retries: ${filePath}`,
+        e,
+      );
     }
-    return { status: 'deleted', id };
   }
 }
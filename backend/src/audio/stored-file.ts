@@ -0,0 +1,8 @@
+// The file currently backing an Audio record. Once ArchiveService has run,
+// the original upload is gone and processedS3Key holds the Opus archive.
+export function storedFilePath(audio: {
+  originalS3Key: string;
+  processedS3Key: string | null;
+}): string {
+  return audio.processedS3Key ?? audio.originalS3Key;
+}
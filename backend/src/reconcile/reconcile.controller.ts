@@ -0,0 +1,13 @@
+import { Controller, Post, Query } from '@nestjs/common';
+import { ReconcileService } from './reconcile.service';
+
+@Controller('reconcile')
+export class ReconcileController {
+  constructor(private readonly reconcileService: ReconcileService) {}
+
+  // Dry run by default; pass ?apply=true to actually delete.
+  @Post('run')
+  async run(@Query('apply') apply?: string) {
+    return this.reconcileService.reconcile(apply !== 'true');
+  }
+}
@@ -0,0 +1,382 @@
+import { Test, TestingModule } from '@nestjs/testing';
+import { ReconcileService, ReconcileSummary } from './reconcile.service';
+import { PrismaService } from '../prisma/prisma.service';
+import { externalSort, mergeJoin } from './sorted-stream';
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+
+async function* fromArray<T>(items: T[]) {
+  yield* items;
+}
+
+async function collect<T>(source: AsyncIterable<T>): Promise<T[]> {
+  const items: T[] = [];
+  for await (const item of source) {
+    items.push(item);
+  }
+  return items;
+}
+
+describe('ReconcileService', () => {
+  const old = new Date(Date.now() - 24 * 60 * 60 * 1000);
+
+  // a1 has been archived: its original upload is gone by design.
+  const audios = [
+    {
+      id: 'a1',
+      originalS3Key: path.join('uploads', '1-kept.wav'),
+      processedS3Key: path.join('uploads', '1-kept.opus'),
+      processingStatus: 'COMPLETED',
+    },
+    {
+      id: 'a2',
+      originalS3Key: path.join('uploads', '2-missing.wav'),
+      processedS3Key: null,
+      processingStatus: 'PROCESSING',
+    },
+  ];
+
+  const prisma = {
+    audio: {
+      findMany: jest.fn(async ({ where, orderBy }) => {
+        const sortKey = Object.keys([orderBy].flat()[0])[0];
+        return audios
+          .filter(
+            (a) =>
+              (!where?.processingStatus ||
+                a.processingStatus === where.processingStatus) &&
+              (where?.processedS3Key !== null || a.processedS3Key === null) &&
+              a[sortKey] !== null,
+          )
+          .sort((x, y) => (x[sortKey] < y[sortKey] ? -1 : 1));
+      }),
+    },
+    export: {
+      findMany: jest.fn(async ({ where }) =>
+        [
+          {
+            id: 'e1',
+            cloudUrl: 'https://www.dropbox.com/scl/fi/gone',
+            createdAt: old,
+          },
+          // Link not listed yet: an export finishing while the run is going
+          {
+            id: 'e2',
+            cloudUrl: 'https://www.dropbox.com/scl/fi/in-flight',
+            createdAt: new Date(),
+          },
+          {
+            id: 'e3',
+            cloudUrl: 'https://www.dropbox.com/scl/fi/kept',
+            createdAt: old,
+          },
+        ].filter((e) => e.createdAt <= where.createdAt.lte),
+      ),
+      deleteMany: jest.fn(),
+    },
+  };
+
+  const file = (path_lower: string, modified = old) => ({
+    '.tag': 'file',
+    path_lower,
+    server_modified: modified.toISOString(),
+  });
+  const folder = (path_lower: string) => ({ '.tag': 'folder', path_lower });
+  const link = (path_lower: string, url: string) => ({
+    '.tag': 'file',
+    url: `https://www.dropbox.com/scl/fi/${url}`,
+    path_lower,
+  });
+
+  const dropbox = {
+    filesListFolder: jest.fn(async () => ({
+      result: {
+        entries: [
+          folder('/exports'),
+          folder('/exports/a1'),
+          file('/exports/a1/kept.txt'),
+          file('/exports/a1/stray.txt'),
+          // Upload whose link was never created (or was revoked)
+          file('/exports/a1/unlinked.txt'),
+          file('/exports/a1/fresh.txt', new Date()),
+          // Inside an orphan folder: covered by that folder, not re-counted
+          folder('/exports/deleted'),
+          file('/exports/deleted/export.txt'),
+          // No Audio row either, but written to moments ago
+          folder('/exports/recent'),
+          file('/exports/recent/export.txt', new Date()),
+        ],
+        has_more: false,
+      },
+    })),
+    sharingListSharedLinks: jest.fn(async () => ({
+      result: {
+        links: [
+          link('/exports/a1/kept.txt', 'kept'),
+          link('/exports/a1/stray.txt', 'stray'),
+          link('/exports/deleted/export.txt', 'orphaned'),
+        ],
+        has_more: false,
+      },
+    })),
+    filesDeleteBatch: jest.fn(),
+    filesDeleteBatchCheck: jest.fn(),
+  };
+
+  let service: ReconcileService;
+  let workDir: string;
+  let previousCwd: string;
+
+  beforeEach(async () => {
+    jest.clearAllMocks();
+    previousCwd = process.cwd();
+    workDir = fs.mkdtempSync(path.join(os.tmpdir(), 'reconcile-spec-'));
+    process.chdir(workDir);
+
+    fs.mkdirSync('uploads');
+    for (const name of ['1-kept.opus', 'orphan.m4a']) {
+      fs.writeFileSync(path.join('uploads', name), '');
+      fs.utimesSync(path.join('uploads', name), old, old);
+    }
+    fs.writeFileSync(path.join('uploads', 'fresh.m4a'), '');
+    fs.mkdirSync(path.join('.tmp', 'a2'), { recursive: true });
+    fs.mkdirSync(path.join('.tmp', 'abandoned'), { recursive: true });
+    fs.utimesSync(path.join('.tmp', 'abandoned'), old, old);
+
+    const module: TestingModule = await Test.createTestingModule({
+      providers: [
+        ReconcileService,
+        { provide: PrismaService, useValue: prisma },
+      ],
+    }).compile();
+
+    service = module.get<ReconcileService>(ReconcileService);
+    (service as any).dbx = dropbox;
+  });
+
+  afterEach(() => {
+    process.chdir(previousCwd);
+    fs.rmSync(workDir, { recursive: true, force: true });
+  });
+
+  it('should be defined', () => {
+    expect(service).toBeDefined();
+  });
+
+  it('reports orphans without deleting anything on a dry run', async () => {
+    const summary = (await service.reconcile()) as ReconcileSummary;
+
+    expect(summary.counts).toEqual({
+      orphanExportFolders: 1,
+      orphanExportFiles: 2,
+      danglingExports: 1,
+      orphanLocalFiles: 1,
+      missingLocalFiles: 1,
+      staleScratchDirs: 1,
+    });
+    expect(summary.failures).toEqual([]);
+    expect(dropbox.filesListFolder).toHaveBeenCalledWith({
+      path: '/exports',
+      recursive: true,
+    });
+    expect(summary.samples.orphanExportFolders).toEqual(['/exports/deleted']);
+    expect(summary.samples.orphanExportFiles.sort()).toEqual([
+      '/exports/a1/stray.txt',
+      '/exports/a1/unlinked.txt',
+    ]);
+    expect(summary.samples.danglingExports).toEqual(['e1']);
+    expect(summary.samples.missingLocalFiles).toEqual([
+      path.join('uploads', '2-missing.wav'),
+    ]);
+    expect(summary.samples.orphanLocalFiles).toEqual([
+      path.join('uploads', 'orphan.m4a'),
+    ]);
+    expect(summary.samples.staleScratchDirs).toEqual([
+      path.join('.tmp', 'abandoned'),
+    ]);
+    const reportLines = fs
+      .readFileSync(summary.reportPath, 'utf8')
+      .trim()
+      .split('\n');
+    expect(reportLines).toHaveLength(7);
+
+    expect(prisma.export.deleteMany).not.toHaveBeenCalled();
+    expect(dropbox.filesDeleteBatch).not.toHaveBeenCalled();
+    expect(fs.existsSync(path.join('uploads', 'orphan.m4a'))).toBe(true);
+  });
+
+  // Dropbox delete jobs report in_progress once, then complete with every
+  // entry deleted.
+  const acceptDeletes = () => {
+    (service as any).deletePollMs = 0;
+    const jobs = new Map<string, { entries: unknown[]; checks: number }>();
+    dropbox.filesDeleteBatch.mockImplementation(async ({ entries }) => {
+      const id = `job-${jobs.size + 1}`;
+      jobs.set(id, { entries, checks: 0 });
+      return { result: { '.tag': 'async_job_id', async_job_id: id } };
+    });
+    dropbox.filesDeleteBatchCheck.mockImplementation(async (arg) => {
+      const job = jobs.get(arg.async_job_id);
+      return job.checks++ === 0
+        ? { result: { '.tag': 'in_progress' } }
+        : {
+            result: {
+              '.tag': 'complete',
+              entries: job.entries.map(() => ({ '.tag': 'success' })),
+            },
+          };
+    });
+    prisma.export.deleteMany.mockImplementation(async ({ where }) => ({
+      count: where.id.in.length,
+    }));
+  };
+
+  it('deletes orphans in batches when applied', async () => {
+    acceptDeletes();
+
+    const summary = (await service.reconcile(false)) as ReconcileSummary;
+
+    expect(summary.failures).toEqual([]);
+    expect(dropbox.filesDeleteBatch).toHaveBeenCalledTimes(2);
+    expect(dropbox.filesDeleteBatch.mock.calls[0][0]).toEqual({
+      entries: [{ path: '/exports/deleted' }],
+    });
+    expect(
+      dropbox.filesDeleteBatch.mock.calls[1][0].entries
+        .map((e) => e.path)
+        .sort(),
+    ).toEqual(['/exports/a1/stray.txt', '/exports/a1/unlinked.txt']);
+    // Each job is polled until it leaves in_progress
+    expect(dropbox.filesDeleteBatchCheck.mock.calls).toEqual([
+      [{ async_job_id: 'job-1' }],
+      [{ async_job_id: 'job-1' }],
+      [{ async_job_id: 'job-2' }],
+      [{ async_job_id: 'job-2' }],
+    ]);
+    expect(prisma.export.deleteMany).toHaveBeenCalledTimes(1);
+    expect(prisma.export.deleteMany).toHaveBeenCalledWith({
+      where: { id: { in: ['e1'] } },
+    });
+    expect(summary.deleted).toEqual({
+      orphanExportFolders: 1,
+      orphanExportFiles: 2,
+      danglingExports: 1,
+      orphanLocalFiles: 1,
+      missingLocalFiles: 0,
+      staleScratchDirs: 1,
+    });
+
+    expect(fs.existsSync(path.join('uploads', 'orphan.m4a'))).toBe(false);
+    expect(fs.existsSync(path.join('.tmp', 'abandoned'))).toBe(false);
+    // Referenced or too recent to judge
+    expect(fs.existsSync(path.join('uploads', '1-kept.opus'))).toBe(true);
+    expect(fs.existsSync(path.join('uploads', 'fresh.m4a'))).toBe(true);
+    expect(fs.existsSync(path.join('.tmp', 'a2'))).toBe(true);
+  });
+
+  it('deletes no exports when no Export row matches a link', async () => {
+    acceptDeletes();
+    dropbox.sharingListSharedLinks.mockResolvedValueOnce({
+      result: { links: [], has_more: false },
+    });
+
+    const summary = (await service.reconcile(false)) as ReconcileSummary;
+
+    expect(summary.failures).toEqual([
+      {
+        pass: 'exportLinks',
+        error:
+          'None of 2 Export rows matches a file under /exports; deletes skipped',
+      },
+    ]);
+    expect(summary.counts.danglingExports).toBe(2);
+    expect(summary.counts.orphanExportFiles).toBe(3);
+    expect(prisma.export.deleteMany).not.toHaveBeenCalled();
+    // Only the orphan folder pass, which does not depend on the links
+    expect(dropbox.filesDeleteBatch).toHaveBeenCalledTimes(1);
+    expect(dropbox.filesDeleteBatch).toHaveBeenCalledWith({
+      entries: [{ path: '/exports/deleted' }],
+    });
+    expect(summary.deleted.orphanExportFiles).toBe(0);
+  });
+
+  it('does not join against orphan folders when that pass failed', async () => {
+    prisma.audio.findMany.mockRejectedValueOnce(new Error('database locked'));
+
+    const summary = (await service.reconcile()) as ReconcileSummary;
+
+    expect(summary.failures).toEqual([
+      { pass: 'exportFolders', error: 'database locked' },
+      {
+        pass: 'exportLinks',
+        error: 'exportFolders failed; files in orphan folders not excluded',
+      },
+    ]);
+    expect(summary.samples.orphanExportFiles).toContain(
+      '/exports/deleted/export.txt',
+    );
+  });
+
+  it('keeps running the local passes when Dropbox fails', async () => {
+    (service as any).dbx = {
+      filesListFolder: jest.fn().mockRejectedValue(new Error('invalid token')),
+      sharingListSharedLinks: jest
+        .fn()
+        .mockRejectedValue(new Error('invalid token')),
+    };
+
+    const summary = (await service.reconcile()) as ReconcileSummary;
+
+    expect(summary.failures).toEqual([
+      { pass: 'exportFolders', error: 'invalid token' },
+      { pass: 'exportLinks', error: 'invalid token' },
+    ]);
+    expect(summary.counts.orphanLocalFiles).toBe(1);
+    expect(summary.counts.staleScratchDirs).toBe(1);
+  });
+
+  it('is not left busy when the report cannot be written', async () => {
+    (service as any).reportDir = path.join('uploads', 'orphan.m4a');
+
+    await expect(service.reconcile()).rejects.toThrow();
+
+    (service as any).reportDir = 'reports';
+    const summary = (await service.reconcile()) as ReconcileSummary;
+    expect(summary.counts.orphanLocalFiles).toBe(1);
+  });
+});
+
+describe('sorted-stream', () => {
+  it('externalSort spills runs to disk and merges them back in order', async () => {
+    const keys = Array.from({ length: 250 }, (_, i) =>
+      String((i * 97) % 250).padStart(3, '0'),
+    );
+    const sorted = await collect(externalSort(fromArray(keys), (k) => k, 40));
+    expect(sorted).toEqual([...keys].sort());
+  });
+
+  it('mergeJoin pairs matches and keeps one-sided keys', async () => {
+    const rows = await collect(
+      mergeJoin(
+        fromArray(['a', 'a', 'b', 'd']),
+        fromArray(['a', 'c', 'd', 'd']),
+        (k) => k,
+        (k) => k,
+      ),
+    );
+    expect(rows).toEqual([
+      { left: 'a', right: 'a' },
+      { left: 'a', right: 'a' },
+      { left: 'b' },
+      { right: 'c' },
+      { left: 'd', right: 'd' },
+    ]);
+  });
+
+  it('mergeJoin refuses unsorted input', async () => {
+    await expect(
+      collect(mergeJoin(fromArray(['b', 'a']), fromArray([]), String, String)),
+    ).rejects.toThrow('not sorted');
+  });
+});
@@ -0,0 +1,793 @@
+import { Injectable, Logger } from '@nestjs/common';
+import { PrismaService } from '../prisma/prisma.service';
+import {
+  BatchQueue,
+  externalSort,
+  mergeJoin,
+  readLines,
+} from './sorted-stream';
+import * as Dropbox from 'dropbox';
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+
+export type OrphanCategory =
+  | 'orphanExportFolders' // Dropbox /exports/{audioId} with no Audio row
+  | 'orphanExportFiles' // Dropbox export file with no Export row
+  | 'danglingExports' // Export row whose file or shared link is gone
+  | 'orphanLocalFiles' // uploads/ file referenced by no Audio row
+  | 'missingLocalFiles' // Audio row whose file is gone (report only)
+  | 'staleScratchDirs'; // .tmp/{audioId}/ not owned by a PROCESSING audio
+
+const CATEGORIES: OrphanCategory[] = [
+  'orphanExportFolders',
+  'orphanExportFiles',
+  'danglingExports',
+  'orphanLocalFiles',
+  'missingLocalFiles',
+  'staleScratchDirs',
+];
+
+export interface ReconcileSummary {
+  dryRun: boolean;
+  startedAt: Date;
+  finishedAt: Date;
+  reportPath: string;
+  counts: Record<OrphanCategory, number>;
+  deleted: Record<OrphanCategory, number>;
+  samples: Record<OrphanCategory, string[]>;
+  failures: { pass: string; error: string }[];
+}
+
+interface ListedEntry {
+  key: string;
+  path: string;
+  modifiedAt?: number; // epoch ms; entries newer than the grace period are kept
+  url?: string; // shared link of a Dropbox export file, if it has one
+}
+
+const UPLOADS_DIR = 'uploads';
+const SCRATCH_DIR = '.tmp';
+const DB_PAGE_SIZE = 1000;
+const DROPBOX_DELETE_BATCH = 1000; // files/delete_batch hard limit
+const DB_DELETE_BATCH = 500; // stays under SQLite's bound-variable limit
+const LOCAL_DELETE_BATCH = 100;
+const SAMPLE_SIZE = 20;
+
+// Append-only text file written with backpressure. The file is opened
+// synchronously so an unwritable path throws here rather than surfacing
+// later as an unhandled stream 'error' event.
+class LineFile {
+  private out: fs.WriteStream;
+
+  constructor(readonly filePath: string) {
+    fs.mkdirSync(path.dirname(filePath), { recursive: true });
+    const fd = fs.openSync(filePath, 'w');
+    this.out = fs.createWriteStream('', { fd });
+  }
+
+  async write(line: string) {
+    if (!this.out.write(line + '\n')) {
+      await new Promise((resolve) => this.out.once('drain', resolve));
+    }
+  }
+
+  close(): Promise<void> {
+    return new Promise((resolve) => this.out.end(resolve));
+  }
+}
+
+// Streams the result and the full item list of one reconcile run. Only
+// counts and a handful of samples are kept in memory; everything else goes
+// to an NDJSON report file.
+class ReconcileReport {
+  readonly counts = {} as Record<OrphanCategory, number>;
+  readonly deleted = {} as Record<OrphanCategory, number>;
+  readonly samples = {} as Record<OrphanCategory, string[]>;
+  readonly failures: { pass: string; error: string }[] = [];
+  private out: LineFile;
+
+  constructor(readonly reportPath: string) {
+    this.out = new LineFile(reportPath);
+    for (const category of CATEGORIES) {
+      this.counts[category] = 0;
+      this.deleted[category] = 0;
+      this.samples[category] = [];
+    }
+  }
+
+  async record(category: OrphanCategory, key: string) {
+    this.counts[category]++;
+    if (this.samples[category].length < SAMPLE_SIZE) {
+      this.samples[category].push(key);
+    }
+    await this.out.write(JSON.stringify({ category, key }));
+  }
+
+  close(): Promise<void> {
+    return this.out.close();
+  }
+}
+
+// "/exports/{audioId}/file.txt" -> "{audioId}"
+function exportFolderOf(dropboxPath: string): string {
+  return dropboxPath.split('/')[2] ?? '';
+}
+
+async function* readEntries(file: string): AsyncGenerator<ListedEntry> {
+  for await (const line of readLines(file)) {
+    yield JSON.parse(line) as ListedEntry;
+  }
+}
+
+// Collapses entries sorted by key into one per key, keeping the newest
+// modifiedAt (undefined if none of them has one).
+async function* newestPerKey(
+  source: AsyncIterable<ListedEntry>,
+): AsyncGenerator<ListedEntry> {
+  let current: ListedEntry | undefined;
+  for await (const entry of source) {
+    if (current && current.key === entry.key) {
+      if ((entry.modifiedAt ?? -Infinity) > (current.modifiedAt ?? -Infinity)) {
+        current.modifiedAt = entry.modifiedAt;
+      }
+      continue;
+    }
+    if (current) {
+      yield current;
+    }
+    current = { ...entry };
+  }
+  if (current) {
+    yield current;
+  }
+}
+
+@Injectable()
+export class ReconcileService {
+  private readonly logger = new Logger(ReconcileService.name);
+  private dbx: Dropbox.Dropbox;
+  private running = false;
+
+  // Anything touched more recently than this may belong to an upload or
+  // export that is still in flight, so it is never treated as an orphan.
+  private readonly graceMs =
+    Number(process.env.RECONCILE_GRACE_MINUTES ?? 60) * 60 * 1000;
+  private readonly reportDir = process.env.RECONCILE_REPORT_DIR || 'reports';
+  private readonly deletePollMs = 1000;
+
+  constructor(private prisma: PrismaService) {
+    this.dbx = new Dropbox.Dropbox({
+      accessToken: process.env.DROPBOX_ACCESS_TOKEN,
+    });
+  }
+
+  async reconcile(
+    dryRun = true,
+  ): Promise<ReconcileSummary | { status: 'busy' }> {
+    if (this.running) {
+      return { status: 'busy' };
+    }
+    this.running = true;
+
+    const startedAt = new Date();
+    const cutoff = startedAt.getTime() - this.graceMs;
+    let report: ReconcileReport | undefined;
+    let scratchDir: string | undefined;
+
+    try {
+      report = new ReconcileReport(
+        path.join(
+          this.reportDir,
+          `reconcile-${startedAt.toISOString().replace(/[:.]/g, '-')}.ndjson`,
+        ),
+      );
+      scratchDir = fs.mkdtempSync(path.join(os.tmpdir(), 'reconcile-run-'));
+      const spillDir = scratchDir;
+      const orphanFolders = path.join(spillDir, 'orphan-folders.txt');
+      let foldersListed = false;
+
+      this.logger.log(`Reconcile started (dryRun=${dryRun})`);
+
+      // Each pass fails on its own: a Dropbox outage or missing token must
+      // not stop the local uploads/ and .tmp/ checks from running.
+      const passes: [string, (r: ReconcileReport) => Promise<void>][] = [
+        [
+          'exportFolders',
+          async (r) => {
+            await this.reconcileExportFolders(r, dryRun, cutoff, orphanFolders);
+            foldersListed = true;
+          },
+        ],
+        [
+          'exportLinks',
+          (r) =>
+            this.reconcileExportLinks(
+              r,
+              dryRun,
+              cutoff,
+              spillDir,
+              foldersListed ? orphanFolders : null,
+            ),
+        ],
+        ['localFiles', (r) => this.reconcileLocalFiles(r, dryRun, cutoff)],
+        ['scratchDirs', (r) => this.reconcileScratchDirs(r, dryRun, cutoff)],
+      ];
+      for (const [pass, run] of passes) {
+        try {
+          await run(report);
+        } catch (e: any) {
+          this.logger.error(`Reconcile pass ${pass} failed: ${e.message}`);
+          report.failures.push({ pass, error: e.message });
+        }
+      }
+
+      this.logger.log(
+        `Reconcile finished: ${JSON.stringify(report.counts)} (report: ${report.reportPath})`,
+      );
+
+      return {
+        dryRun,
+        startedAt,
+        finishedAt: new Date(),
+        reportPath: report.reportPath,
+        counts: report.counts,
+        deleted: report.deleted,
+        samples: report.samples,
+        failures: report.failures,
+      };
+    } finally {
+      await report?.close();
+      if (scratchDir) {
+        fs.rmSync(scratchDir, { recursive: true, force: true });
+      }
+      this.running = false;
+    }
+  }
+
+  // ==================== RECONCILE PASSES ====================
+
+  // Orphan folder names are also spilled to `orphanFolders` so the link pass
+  // can leave their files alone: on a dry run the folders still exist and
+  // their files would otherwise be counted a second time. A folder counts as
+  // modified when its newest file was.
+  private async reconcileExportFolders(
+    report: ReconcileReport,
+    dryRun: boolean,
+    cutoff: number,
+    orphanFolders: string,
+  ) {
+    const spill = new LineFile(orphanFolders);
+    try {
+      const deletes = this.dropboxDeleteQueue(
+        report,
+        'orphanExportFolders',
+        dryRun,
+      );
+      const folders = newestPerKey(
+        externalSort(this.listExportFolders(), (e) => e.key),
+      );
+
+      for await (const row of mergeJoin(
+        this.streamAudioIds(),
+        folders,
+        (id) => id,
+        (e) => e.key,
+      )) {
+        if (row.right && !row.left && this.isPastGrace(row.right, cutoff)) {
+          await report.record('orphanExportFolders', row.right.path);
+          await spill.write(row.right.key);
+          await deletes.push(row.right.path);
+        }
+      }
+      await deletes.drain();
+    } finally {
+      await spill.close();
+    }
+  }
+
+  // Every file under /exports is checked, not just the ones with a shared
+  // link: an upload whose link creation failed, or whose link was revoked,
+  // would otherwise stay in Dropbox with nothing pointing at it.
+  private async reconcileExportLinks(
+    report: ReconcileReport,
+    dryRun: boolean,
+    cutoff: number,
+    spillDir: string,
+    orphanFolders: string | null,
+  ) {
+    const dangling = path.join(spillDir, 'dangling-exports.txt');
+    const unreferenced = path.join(spillDir, 'unreferenced-files.ndjson');
+    const deletesAllowed = await this.matchExportFiles(
+      report,
+      cutoff,
+      dangling,
+      unreferenced,
+    );
+
+    // Files without an Export row, joined by folder name against the orphan
+    // folders from the previous pass; files inside those are already covered.
+    // If that pass failed its list is incomplete, so the join is skipped.
+    let files = readEntries(unreferenced);
+    if (orphanFolders === null) {
+      report.failures.push({
+        pass: 'exportLinks',
+        error: 'exportFolders failed; files in orphan folders not excluded',
+      });
+    } else {
+      files = this.excludeOrphanFolders(files, orphanFolders);
+    }
+
+    const fileDeletes = this.dropboxDeleteQueue(
+      report,
+      'orphanExportFiles',
+      dryRun,
+    );
+    for await (const file of files) {
+      await report.record('orphanExportFiles', file.path);
+      if (deletesAllowed) {
+        await fileDeletes.push(file.path);
+      }
+    }
+    await fileDeletes.drain();
+
+    if (!dryRun && deletesAllowed) {
+      const rowDeletes = new BatchQueue<string>(
+        DB_DELETE_BATCH,
+        async (ids) => {
+          const { count } = await this.prisma.export.deleteMany({
+            where: { id: { in: ids } },
+          });
+          report.deleted.danglingExports += count;
+        },
+      );
+      for await (const id of readLines(dangling)) {
+        await rowDeletes.push(id);
+      }
+      await rowDeletes.drain();
+    }
+  }
+
+  // Joins the files under /exports with their shared links by path, then
+  // with the Export rows by URL. Dangling row ids and unreferenced files
+  // are spilled rather than deleted straight away, so that nothing is
+  // deleted if no row matched at all: that is far more likely a wrong token
+  // or a changed URL format than every export being gone.
+  private async matchExportFiles(
+    report: ReconcileReport,
+    cutoff: number,
+    dangling: string,
+    unreferenced: string,
+  ): Promise<boolean> {
+    const danglingIds = new LineFile(dangling);
+    const unreferencedFiles = new LineFile(unreferenced);
+    let rows = 0;
+    let matched = 0;
+
+    try {
+      const linked = this.attachLinks(cutoff, unreferencedFiles);
+      for await (const row of mergeJoin(
+        this.streamExports(cutoff),
+        externalSort(linked, (e) => e.url as string),
+        (e) => e.cloudUrl,
+        (e) => e.url as string,
+      )) {
+        if (row.left) {
+          rows++;
+        }
+        if (row.left && row.right) {
+          matched++;
+        } else if (row.left) {
+          await report.record('danglingExports', row.left.id);
+          await danglingIds.write(row.left.id);
+        } else if (row.right && this.isPastGrace(row.right, cutoff)) {
+          await unreferencedFiles.write(JSON.stringify(row.right));
+        }
+      }
+    } finally {
+      await danglingIds.close();
+      await unreferencedFiles.close();
+    }
+
+    if (rows > 0 && matched === 0) {
+      const error = `None of ${rows} Export rows matches a file under /exports; deletes skipped`;
+      this.logger.error(error);
+      report.failures.push({ pass: 'exportLinks', error });
+      return false;
+    }
+    return true;
+  }
+
+  // Yields the files under /exports that have a shared link, with its URL
+  // attached. Files without one can never match an Export row, so those
+  // past the grace period go straight to `unreferencedFiles`.
+  private async *attachLinks(
+    cutoff: number,
+    unreferencedFiles: LineFile,
+  ): AsyncGenerator<ListedEntry> {
+    const byPath = (e: ListedEntry) => e.path;
+    for await (const row of mergeJoin(
+      externalSort(this.listExportFiles(), byPath),
+      externalSort(this.listExportLinks(), byPath),
+      byPath,
+      byPath,
+    )) {
+      if (row.left && row.right) {
+        yield { ...row.left, url: row.right.key };
+      } else if (row.left && this.isPastGrace(row.left, cutoff)) {
+        await unreferencedFiles.write(JSON.stringify(row.left));
+      }
+    }
+  }
+
+  private async *excludeOrphanFolders(
+    files: AsyncIterable<ListedEntry>,
+    orphanFolders: string,
+  ): AsyncGenerator<ListedEntry> {
+    const byFolder = (e: ListedEntry) => exportFolderOf(e.path);
+    for await (const row of mergeJoin(
+      externalSort(readLines(orphanFolders), (name) => name),
+      externalSort(files, byFolder),
+      (name) => name,
+      byFolder,
+    )) {
+      if (row.right && !row.left) {
+        yield row.right;
+      }
+    }
+  }
+
+  private async reconcileLocalFiles(
+    report: ReconcileReport,
+    dryRun: boolean,
+    cutoff: number,
+  ) {
+    const deletes = this.localDeleteQueue(report, 'orphanLocalFiles', dryRun);
+    const files = externalSort(
+      this.listLocal(UPLOADS_DIR, 'file'),
+      (e) => e.key,
+    );
+
+    for await (const row of mergeJoin(
+      this.streamStoredPaths(),
+      files,
+      (p) => p,
+      (e) => e.key,
+    )) {
+      if (row.left && !row.right) {
+        await report.record('missingLocalFiles', row.left);
+      } else if (
+        row.right &&
+        !row.left &&
+        this.isPastGrace(row.right, cutoff)
+      ) {
+        await report.record('orphanLocalFiles', row.right.path);
+        await deletes.push(row.right.path);
+      }
+    }
+    await deletes.drain();
+  }
+
+  private async reconcileScratchDirs(
+    report: ReconcileReport,
+    dryRun: boolean,
+    cutoff: number,
+  ) {
+    const deletes = this.localDeleteQueue(report, 'staleScratchDirs', dryRun);
+    const dirs = externalSort(
+      this.listLocal(SCRATCH_DIR, 'directory'),
+      (e) => e.key,
+    );
+
+    for await (const row of mergeJoin(
+      this.streamAudioIds('PROCESSING'),
+      dirs,
+      (id) => id,
+      (e) => e.key,
+    )) {
+      if (row.right && !row.left && this.isPastGrace(row.right, cutoff)) {
+        await report.record('staleScratchDirs', row.right.path);
+        await deletes.push(row.right.path);
+      }
+    }
+    await deletes.drain();
+  }
+
+  // ==================== DATABASE STREAMS ====================
+  // Keyset pagination ("rows after the last key seen") keeps memory flat
+  // regardless of table size and, unlike Prisma's cursor option, survives
+  // rows being deleted mid-stream by the batch deletes below.
+
+  private async *streamAudioIds(status?: 'PROCESSING'): AsyncGenerator<string> {
+    let lastId: string | undefined;
+    while (true) {
+      const page = await this.prisma.audio.findMany({
+        where: {
+          ...(status ? { processingStatus: status } : {}),
+          ...(lastId ? { id: { gt: lastId } } : {}),
+        },
+        orderBy: { id: 'asc' },
+        select: { id: true },
+        take: DB_PAGE_SIZE,
+      });
+      for (const audio of page) {
+        yield audio.id;
+      }
+      if (page.length < DB_PAGE_SIZE) {
+        return;
+      }
+      lastId = page[page.length - 1].id;
+    }
+  }
+
+  // Rows newer than `cutoff` are skipped: generateExport creates the shared
+  // link before the Export row, so a fresh link may not have its row yet.
+  private async *streamExports(cutoff: number): AsyncGenerator<{
+    id: string;
+    cloudUrl: string;
+  }> {
+    let last: { id: string; cloudUrl: string } | undefined;
+    while (true) {
+      const page = await this.prisma.export.findMany({
+        where: {
+          createdAt: { lte: new Date(cutoff) },
+          ...(last
+            ? {
+                OR: [
+                  { cloudUrl: { gt: last.cloudUrl } },
+                  { cloudUrl: last.cloudUrl, id: { gt: last.id } },
+                ],
+              }
+            : {}),
+        },
+        orderBy: [{ cloudUrl: 'asc' }, { id: 'asc' }],
+        select: { id: true, cloudUrl: true },
+        take: DB_PAGE_SIZE,
+      });
+      yield* page;
+      if (page.length < DB_PAGE_SIZE) {
+        return;
+      }
+      last = page[page.length - 1];
+    }
+  }
+
+  // The current stored file of every row (see storedFilePath): originals of
+  // rows that were never archived, merged with the Opus archives of those
+  // that were. Archived originals are deleted by design, so they must not
+  // show up here as missing.
+  private async *streamStoredPaths(): AsyncGenerator<string> {
+    for await (const row of mergeJoin(
+      this.streamOriginalPaths(),
+      this.streamArchivePaths(),
+      (p) => p,
+      (p) => p,
+    )) {
+      yield (row.left ?? row.right) as string;
+    }
+  }
+
+  private async *streamOriginalPaths(): AsyncGenerator<string> {
+    let last: { id: string; originalS3Key: string } | undefined;
+    while (true) {
+      const page = await this.prisma.audio.findMany({
+        where: {
+          processedS3Key: null,
+          ...(last
+            ? {
+                OR: [
+                  { originalS3Key: { gt: last.originalS3Key } },
+                  { originalS3Key: last.originalS3Key, id: { gt: last.id } },
+                ],
+              }
+            : {}),
+        },
+        orderBy: [{ originalS3Key: 'asc' }, { id: 'asc' }],
+        select: { id: true, originalS3Key: true },
+        take: DB_PAGE_SIZE,
+      });
+      for (const audio of page) {
+        yield audio.originalS3Key;
+      }
+      if (page.length < DB_PAGE_SIZE) {
+        return;
+      }
+      last = page[page.length - 1];
+    }
+  }
+
+  private async *streamArchivePaths(): AsyncGenerator<string> {
+    let last: { id: string; processedS3Key: string } | undefined;
+    while (true) {
+      const page = await this.prisma.audio.findMany({
+        where: last
+          ? {
+              OR: [
+                { processedS3Key: { gt: last.processedS3Key } },
+                { processedS3Key: last.processedS3Key, id: { gt: last.id } },
+              ],
+            }
+          : { processedS3Key: { not: null } },
+        orderBy: [{ processedS3Key: 'asc' }, { id: 'asc' }],
+        select: { id: true, processedS3Key: true },
+        take: DB_PAGE_SIZE,
+      });
+      for (const audio of page) {
+        yield audio.processedS3Key as string;
+      }
+      if (page.length < DB_PAGE_SIZE) {
+        return;
+      }
+      const tail = page[page.length - 1];
+      last = { id: tail.id, processedS3Key: tail.processedS3Key as string };
+    }
+  }
+
+  // ==================== REMOTE / DISK LISTINGS ====================
+  // Listings come back in no particular order; callers pipe them through
+  // externalSort before joining.
+
+  // Everything under `folder`, files and folders, at any depth.
+  private async *listDropboxTree(folder: string): AsyncGenerator<any> {
+    let response;
+    try {
+      response = await this.dbx.filesListFolder({
+        path: folder,
+        recursive: true,
+      });
+    } catch (e: any) {
+      if (e?.error?.error_summary?.startsWith('path/not_found')) {
+        return;
+      }
+      throw e;
+    }
+
+    while (true) {
+      yield* response.result.entries;
+      if (!response.result.has_more) {
+        return;
+      }
+      response = await this.dbx.filesListFolderContinue({
+        cursor: response.result.cursor,
+      });
+    }
+  }
+
+  // One entry per /exports/{name} folder and per file inside one, keyed by
+  // folder name; files carry their server_modified time.
+  private async *listExportFolders(): AsyncGenerator<ListedEntry> {
+    for await (const entry of this.listDropboxTree('/exports')) {
+      const entryPath: string = entry.path_lower || '';
+      const depth = entryPath.split('/').length - 2;
+      const isFolder = entry['.tag'] === 'folder' && depth === 1;
+      if (isFolder || (entry['.tag'] === 'file' && depth > 1)) {
+        const name = exportFolderOf(entryPath);
+        yield {
+          key: name,
+          path: `/exports/${name}`,
+          modifiedAt: isFolder ? undefined : Date.parse(entry.server_modified),
+        };
+      }
+    }
+  }
+
+  private async *listExportFiles(): AsyncGenerator<ListedEntry> {
+    for await (const entry of this.listDropboxTree('/exports')) {
+      if (entry['.tag'] === 'file') {
+        yield {
+          key: entry.path_lower,
+          path: entry.path_lower,
+          modifiedAt: Date.parse(entry.server_modified),
+        };
+      }
+    }
+  }
+
+  private async *listExportLinks(): AsyncGenerator<ListedEntry> {
+    let cursor: string | undefined;
+    while (true) {
+      const response = await this.dbx.sharingListSharedLinks(
+        cursor ? { cursor } : {},
+      );
+      for (const link of response.result.links as any[]) {
+        if (
+          link['.tag'] === 'file' &&
+          link.path_lower?.startsWith('/exports/')
+        ) {
+          yield { key: link.url, path: link.path_lower };
+        }
+      }
+      if (!response.result.has_more || !response.result.cursor) {
+        return;
+      }
+      cursor = response.result.cursor;
+    }
+  }
+
+  private async *listLocal(
+    dir: string,
+    kind: 'file' | 'directory',
+  ): AsyncGenerator<ListedEntry> {
+    if (!fs.existsSync(dir)) {
+      return;
+    }
+    for await (const entry of await fs.promises.opendir(dir)) {
+      const matches = kind === 'file' ? entry.isFile() : entry.isDirectory();
+      if (!matches || entry.name.startsWith('.')) {
+        continue;
+      }
+      const entryPath = path.join(dir, entry.name);
+      const { mtimeMs } = await fs.promises.stat(entryPath);
+      yield {
+        key: kind === 'file' ? entryPath : entry.name,
+        path: entryPath,
+        modifiedAt: mtimeMs,
+      };
+    }
+  }
+
+  // ==================== BULK DELETES ====================
+
+  private isPastGrace(entry: ListedEntry, cutoff: number) {
+    return entry.modifiedAt === undefined || entry.modifiedAt <= cutoff;
+  }
+
+  private dropboxDeleteQueue(
+    report: ReconcileReport,
+    category: OrphanCategory,
+    dryRun: boolean,
+  ) {
+    return new BatchQueue<string>(DROPBOX_DELETE_BATCH, async (paths) => {
+      if (!dryRun) {
+        report.deleted[category] += await this.dropboxDeleteBatch(paths);
+      }
+    });
+  }
+
+  private localDeleteQueue(
+    report: ReconcileReport,
+    category: OrphanCategory,
+    dryRun: boolean,
+  ) {
+    return new BatchQueue<string>(LOCAL_DELETE_BATCH, async (paths) => {
+      if (dryRun) {
+        return;
+      }
+      const results = await Promise.allSettled(
+        paths.map((p) => fs.promises.rm(p, { recursive: true, force: true })),
+      );
+      report.deleted[category] += results.filter(
+        (r) => r.status === 'fulfilled',
+      ).length;
+    });
+  }
+
+  // files/delete_batch is asynchronous: it returns a job id that has to be
+  // polled until the whole batch is done. Returns how many entries succeeded.
+  private async dropboxDeleteBatch(paths: string[]): Promise<number> {
+    const launch = await this.dbx.filesDeleteBatch({
+      entries: paths.map((p) => ({ path: p })),
+    });
+
+    let status: any = launch.result;
+    const jobId: string = status.async_job_id;
+    while (
+      status['.tag'] === 'async_job_id' ||
+      status['.tag'] === 'in_progress'
+    ) {
+      await new Promise((r) => setTimeout(r, this.deletePollMs));
+      const check = await this.dbx.filesDeleteBatchCheck({
+        async_job_id: jobId,
+      });
+      status = check.result;
+    }
+
+    if (status['.tag'] !== 'complete') {
+      this.logger.error(
+        `Dropbox delete batch failed: ${JSON.stringify(status)}`,
+      );
+      return 0;
+    }
+    return status.entries.filter((e: any) => e['.tag'] === 'success').length;
+  }
+}
@@ -0,0 +1,206 @@
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+import * as readline from 'readline';
+
+export interface JoinRow<L, R> {
+  left?: L;
+  right?: R;
+}
+
+// Byte-wise UTF-8 order, which is what SQLite's default BINARY collation
+// uses for ORDER BY, so DB streams and sorted listings agree on ordering.
+export function compareKeys(a: string, b: string): number {
+  return Buffer.compare(Buffer.from(a, 'utf8'), Buffer.from(b, 'utf8'));
+}
+
+// Passes items through, throwing if they are not in ascending key order.
+// A merge-join over unsorted input would silently report false orphans.
+export async function* assertSorted<T>(
+  source: AsyncIterable<T>,
+  key: (item: T) => string,
+  label: string,
+): AsyncGenerator<T> {
+  let previous: string | undefined;
+  for await (const item of source) {
+    const current = key(item);
+    if (previous !== undefined && compareKeys(previous, current) > 0) {
+      throw new Error(
+        `${label} is not sorted: "${previous}" came before "${current}"`,
+      );
+    }
+    previous = current;
+    yield item;
+  }
+}
+
+// Full outer merge-join of two ascending streams. Yields { left, right } for
+// matches and one-sided rows for keys present on only one side. Duplicate
+// keys on either side are all reported as matched.
+export async function* mergeJoin<L, R>(
+  leftSource: AsyncIterable<L>,
+  rightSource: AsyncIterable<R>,
+  leftKey: (item: L) => string,
+  rightKey: (item: R) => string,
+): AsyncGenerator<JoinRow<L, R>> {
+  const leftIt = assertSorted(leftSource, leftKey, 'left stream');
+  const rightIt = assertSorted(rightSource, rightKey, 'right stream');
+  let l = await leftIt.next();
+  let r = await rightIt.next();
+  let matchedKey: string | undefined;
+
+  while (!l.done || !r.done) {
+    const order = l.done
+      ? 1
+      : r.done
+        ? -1
+        : compareKeys(leftKey(l.value), rightKey(r.value));
+
+    if (order < 0) {
+      const key = leftKey(l.value as L);
+      if (matchedKey === undefined || compareKeys(key, matchedKey) !== 0) {
+        yield { left: l.value as L };
+      }
+      l = await leftIt.next();
+    } else if (order > 0) {
+      const key = rightKey(r.value as R);
+      if (matchedKey === undefined || compareKeys(key, matchedKey) !== 0) {
+        yield { right: r.value as R };
+      }
+      r = await rightIt.next();
+    } else {
+      matchedKey = leftKey(l.value as L);
+      yield { left: l.value as L, right: r.value as R };
+      l = await leftIt.next();
+    }
+  }
+}
+
+// Streams a text file line by line.
+export async function* readLines(file: string): AsyncGenerator<string> {
+  if (!fs.existsSync(file)) {
+    return;
+  }
+  const lines = readline.createInterface({ input: fs.createReadStream(file) });
+  for await (const line of lines) {
+    if (line) {
+      yield line;
+    }
+  }
+}
+
+async function writeRun<T>(items: T[], file: string) {
+  const out = fs.createWriteStream(file);
+  for (const item of items) {
+    if (!out.write(JSON.stringify(item) + '\n')) {
+      await new Promise((resolve) => out.once('drain', resolve));
+    }
+  }
+  await new Promise<void>((resolve, reject) => {
+    out.on('error', reject);
+    out.end(resolve);
+  });
+}
+
+// Sorts a stream of any size in bounded memory: items are buffered up to
+// `runSize`, each full buffer is sorted and spilled to a temp file, and the
+// runs are then k-way merged back into one ascending stream.
+export async function* externalSort<T>(
+  source: AsyncIterable<T>,
+  key: (item: T) => string,
+  runSize = 50_000,
+): AsyncGenerator<T> {
+  const byKey = (a: T, b: T) => compareKeys(key(a), key(b));
+  let buffer: T[] = [];
+  let tmpDir: string | undefined;
+  const runs: string[] = [];
+
+  try {
+    for await (const item of source) {
+      buffer.push(item);
+      if (buffer.length >= runSize) {
+        tmpDir ??= fs.mkdtempSync(path.join(os.tmpdir(), 'reconcile-'));
+        const file = path.join(tmpDir, `run-${runs.length}.ndjson`);
+        await writeRun(buffer.sort(byKey), file);
+        runs.push(file);
+        buffer = [];
+      }
+    }
+
+    buffer.sort(byKey);
+    if (runs.length === 0) {
+      yield* buffer;
+      return;
+    }
+
+    const readers = [
+      ...runs.map((file) => {
+        const lines = readline.createInterface({
+          input: fs.createReadStream(file),
+        });
+        return lines[Symbol.asyncIterator]();
+      }),
+      (async function* () {
+        for (const item of buffer) {
+          yield JSON.stringify(item);
+        }
+      })(),
+    ];
+    const heads: (T | undefined)[] = await Promise.all(
+      readers.map(async (reader) => {
+        const next = await reader.next();
+        return next.done ? undefined : (JSON.parse(next.value) as T);
+      }),
+    );
+
+    // Run count stays small (total / runSize), so a linear scan for the
+    // minimum head is cheaper than maintaining a heap.
+    while (true) {
+      let min = -1;
+      for (let i = 0; i < heads.length; i++) {
+        if (
+          heads[i] !== undefined &&
+          (min < 0 || byKey(heads[i] as T, heads[min] as T) < 0)
+        ) {
+          min = i;
+        }
+      }
+      if (min < 0) {
+        break;
+      }
+
+      yield heads[min] as T;
+      const next = await readers[min].next();
+      heads[min] = next.done ? undefined : (JSON.parse(next.value) as T);
+    }
+  } finally {
+    if (tmpDir) {
+      fs.rmSync(tmpDir, { recursive: true, force: true });
+    }
+  }
+}
+
+// Flushes items to `flush` in fixed-size batches.
+export class BatchQueue<T> {
+  private items: T[] = [];
+
+  constructor(
+    private readonly size: number,
+    private readonly flush: (batch: T[]) => Promise<void>,
+  ) {}
+
+  async push(item: T) {
+    this.items.push(item);
+    if (this.items.length >= this.size) {
+      await this.drain();
+    }
+  }
+
+  async drain() {
+    if (this.items.length > 0) {
+      const batch = this.items;
+      this.items = [];
+      await this.flush(batch);
+    }
+  }
+}
@@ -1,5 +1,6 @@
 import { Injectable } from '@nestjs/common';
 import { PrismaService } from '../prisma/prisma.service';
+import { storedFilePath } from '../audio/stored-file';
 import { createClient } from '@deepgram/sdk';
 import * as fs from 'fs';
 
@@ -23,7 +24,8 @@ export class TranscriptionService {
     }
 
     // 2. Validate Local File
-    const filePath = audio.originalS3Key; // This is now the local path (e.g. "uploads/...")
+    // Local path (e.g. "uploads/..."); the Opus archive once archived
+    const filePath = storedFilePath(audio);
 
     if (!fs.existsSync(filePath)) {
       console.error(
@@ -96,8 +98,9 @@ export class TranscriptionService {
         `[TranscriptionService] Transcription completed for ID: ${audioId}`,
       );
 
-      // Note: We do NOT delete the file here anymore, as it is the master copy.
-      // If we want to save space later, we could add a cleanup job for old files.
+      // Note: We do NOT delete the file here, as it is the master copy.
+      // ArchiveService later swaps it for a compact Opus copy (processedS3Key)
+      // once the recording is older than ARCHIVE_MIN_AGE_DAYS.
 
       return savedTranscription;
     } catch (error) {